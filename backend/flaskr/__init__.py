@@ -1,28 +1,148 @@
 import os
-from flask import Flask, request, abort, jsonify
+from flask import Flask, Response, request, abort
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS, cross_origin
-import random
-import sys
+from flask_caching import Cache
+from sqlalchemy import func
+import functools
+import hashlib
+import orjson
+import uuid
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category
 
 QUESTIONS_PER_PAGE = 10
+# OFFSET is a bigint, pages past this one cannot hold any row
+MAX_PAGE_INDEX = (2 ** 63 - 1) // QUESTIONS_PER_PAGE
+CATEGORIES_CACHE_TIMEOUT = 300
 
+cache = Cache()
+
+# error payloads never change, serialize them once
+ERROR_MESSAGES = {
+    400: 'Bad request error',
+    404: 'Resource not found',
+    405: 'Method not allowed',
+    422: 'Unprocessable error',
+    500: 'Internal server error has been occured'
+}
+ERROR_BODIES = {
+    code: orjson.dumps({
+        'success': False,
+        'error': code,
+        'message': message
+    })
+    for code, message in ERROR_MESSAGES.items()
+}
+
+
+def ojsonify(obj):
+    # orjson encodes in C, categories use integer keys
+    return Response(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS),
+                    mimetype='application/json')
+
+
+# columns returned by Question.format()
+QUESTION_COLUMNS = (Question.id, Question.question, Question.answer,
+                    Question.category, Question.difficulty)
+
+
+def format_question_rows(questions_query):
+    # select plain column tuples, no ORM instance is built per row
+    questions_rows = questions_query.with_entities(*QUESTION_COLUMNS).all()
+    return [question._asdict() for question in questions_rows]
+
+
+def count_questions(*criterion):
+    # plain COUNT(*) without wrapping the query in a subquery
+    return db.session.query(func.count(Question.id)).filter(
+            *criterion).scalar()
+
+
+def paginate_questions(base_query, page_index=1):
+    if page_index < 1 or page_index > MAX_PAGE_INDEX:
+        # out of range page, the OFFSET would be a database error
+        return []
 
-def paginate_questions(questions_rows, page_index=1):
     start = (page_index-1) * QUESTIONS_PER_PAGE
-    end = start + QUESTIONS_PER_PAGE
 
-    questions = [question.format() for question in questions_rows]
-    current_questions = questions[start:end]
-    return current_questions
+    # let the database do the slicing, only one page of rows is fetched
+    questions_query = base_query.order_by(Question.id).limit(
+                        QUESTIONS_PER_PAGE).offset(start)
+    return format_question_rows(questions_query)
+
+
+def paginate_questions_after(base_query, after_id=0):
+    # keyset pagination, the primary key index finds the page start
+    questions_query = base_query.filter(Question.id > after_id).order_by(
+                        Question.id).limit(QUESTIONS_PER_PAGE)
+    return format_question_rows(questions_query)
+
+
+@functools.lru_cache(maxsize=64)
+def _render_questions_page(questions_version, page_index=1, after_id=None):
+    # keyed on the dataset version, pages of older versions age out
+    if after_id is not None:
+        questions = paginate_questions_after(Question.query, after_id)
+    else:
+        questions = paginate_questions(Question.query, page_index)
+    return tuple(questions), count_questions()
+
+
+def _load_categories_dict():
+    # categories rarely change, serve them from the cache when possible
+    categories_dict = cache.get('categories_dict')
+    if categories_dict is None:
+        categories_rows = db.session.query(
+                            Category.id, Category.type).order_by(
+                            Category.id).all()
+        # convert data to dictionary
+        categories_dict = {category_id: category_type
+                           for category_id, category_type in categories_rows}
+        cache.set('categories_dict', categories_dict,
+                  timeout=CATEGORIES_CACHE_TIMEOUT)
+    return categories_dict
+
+
+def _data_version(version_key):
+    # opaque token replaced every time the dataset is modified, it also
+    # expires so writes from other processes show up within the timeout
+    version = cache.get(version_key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(version_key, version, timeout=CATEGORIES_CACHE_TIMEOUT)
+    return version
+
+
+def _bump_data_version(version_key):
+    cache.set(version_key, uuid.uuid4().hex,
+              timeout=CATEGORIES_CACHE_TIMEOUT)
+
+
+def _make_etag(*version_keys):
+    # hash dataset versions with the url, no response is built for it
+    versions = [_data_version(key) for key in version_keys]
+    etag_source = '|'.join(versions + [request.full_path])
+    return hashlib.blake2b(etag_source.encode(),
+                           digest_size=16).hexdigest()
+
+
+def _not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def _error_response(code):
+    return Response(ERROR_BODIES[code], status=code,
+                    mimetype='application/json')
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
     setup_db(app)
+    cache.init_app(app, config={'CACHE_TYPE': 'simple'})
 
     # Set up CORS. Allow '*' for origins
     CORS(app, resources={'/': {'origins': '*'}})
@@ -42,7 +162,7 @@ def create_app(test_config=None):
     '''
     @app.route('/')
     def index():
-        return jsonify({'Project': 'Trivia API'})
+        return ojsonify({'Project': 'Trivia API'})
 
     '''
     Endpoint to handle GET requests for all available categories.
@@ -50,22 +170,25 @@ def create_app(test_config=None):
     @app.route('/categories')
     @cross_origin()
     def get_categories():
+        etag = _make_etag('categories_version')
+        if etag in request.if_none_match:
+            # client copy is still up to date
+            return _not_modified(etag)
+
         try:
-            categories_rows = Category.query.order_by(Category.id).all()
-            # convert data to dictionary
-            categories_dict = {}
-            for category in categories_rows:
-                categories_dict[category.id] = category.type
+            categories_dict = _load_categories_dict()
 
             # return data
-            return jsonify({
+            response = ojsonify({
                 'success': True,
                 'categories': categories_dict
             })
+            response.set_etag(etag)
+            return response
 
         except Exception:
             # exception details
-            print('\n * Error:\n', sys.exc_info(), '\n')
+            app.logger.exception('Request failed')
             # Server error
             abort(500)
 
@@ -75,20 +198,27 @@ def create_app(test_config=None):
     @app.route('/questions')
     @cross_origin()
     def get_paginated_questions():
+        etag = _make_etag('categories_version', 'questions_version')
+        if etag in request.if_none_match:
+            # client copy is still up to date
+            return _not_modified(etag)
+
         try:
-            categories_rows = Category.query.order_by(Category.id).all()
-            # convert data to dictionary
-            categories_dict = {}
-            for category in categories_rows:
-                categories_dict[category.id] = category.type
-
-            questions_rows = Question.query.order_by(Question.id).all()
-            page_index = request.args.get('page', 1, type=int)
-            questions_paginated = paginate_questions(questions_rows,
-                                                     page_index)
+            categories_dict = _load_categories_dict()
+
+            questions_version = _data_version('questions_version')
+            if 'after_id' in request.args:
+                after_id = request.args.get('after_id', 0, type=int)
+                questions_paginated, total_questions = _render_questions_page(
+                                        questions_version, after_id=after_id)
+            else:
+                # legacy page based pagination
+                page_index = request.args.get('page', 1, type=int)
+                questions_paginated, total_questions = _render_questions_page(
+                                        questions_version, page_index)
         except Exception:
             # exception details
-            print('\n * Error:\n', sys.exc_info(), '\n')
+            app.logger.exception('Request failed')
             # Server error
             abort(500)
 
@@ -97,13 +227,16 @@ def create_app(test_config=None):
             abort(404)
 
         # return data
-        return jsonify({
+        response = ojsonify({
             'success': True,
             'questions': questions_paginated,
-            'total_questions': len(questions_rows),
+            'total_questions': total_questions,
             'categories': categories_dict,
-            'current_category': None
+            'current_category': None,
+            'next_cursor': questions_paginated[-1]['id']
         })
+        response.set_etag(etag)
+        return response
 
     '''
     Endpoint to DELETE question using a question ID
@@ -116,14 +249,15 @@ def create_app(test_config=None):
 
             if question is not None:
                 question.delete()
-                return jsonify({
+                _bump_data_version('questions_version')
+                return ojsonify({
                     'success': True,
                     'deleted': question_id
                 })
 
         except Exception:
             # exception details
-            print('\n * Error :\n', sys.exc_info(), '\n')
+            app.logger.exception('Request failed')
             # Server error
             abort(500)
 
@@ -138,7 +272,10 @@ def create_app(test_config=None):
     @app.route('/questions', methods=['POST'])
     @cross_origin()
     def post_search_or_post_new_question():
-        request_json = request.get_json()
+        request_json = request.get_json(silent=True, cache=True)
+        if not isinstance(request_json, dict):
+            # missing or malformed json body
+            abort(400)
 
         search_term = request_json.get('searchTerm')
         if search_term is not None:
@@ -146,28 +283,37 @@ def create_app(test_config=None):
             '''
             search for question
             '''
+            if not isinstance(search_term, str) or not search_term.strip():
+                # an empty term would match every question
+                abort(400)
+
+            # escape the LIKE wildcards so the term is matched literally
+            escaped_term = search_term.replace('\\', '\\\\').replace(
+                            '%', '\\%').replace('_', '\\_')
+
             try:
-                questions_search = Question.query.filter(
-                                    Question.question.ilike(
-                                      '%' + search_term + '%')).all()
+                search_filter = Question.question.ilike(
+                                  '%' + escaped_term + '%', escape='\\')
+                questions_search = Question.query.filter(search_filter)
+                total_questions = count_questions(search_filter)
 
-                if len(questions_search) > 0:
+                if total_questions > 0:
                     questions_paginated = paginate_questions(questions_search)
 
                     # return data
-                    return jsonify({
+                    return ojsonify({
                         'success': True,
                         'questions': questions_paginated,
-                        'total_questions': len(questions_search)
+                        'total_questions': total_questions
                     })
 
             except Exception:
                 # exception details
-                print('\n * Error:\n', sys.exc_info(), '\n')
+                app.logger.exception('Request failed')
                 # Server error
                 abort(500)
 
-            if len(questions_search) == 0:
+            if total_questions == 0:
                 # Empty result
                 abort(404)
 
@@ -194,27 +340,34 @@ def create_app(test_config=None):
                         difficulty=new_question_difficulty,
                         category=new_question_category
                     )
-                    new_question.insert()
-
-                    questions_rows = Question.query.order_by(Question.id).all()
-                    total_questions = len(questions_rows)
-                    last_page_index = (total_questions
+                    # insert and read back the last page in one transaction
+                    db.session.add(new_question)
+                    db.session.flush()
+                    created_id = new_question.id
+
+                    total_questions = count_questions()
+                    # page holding the newly created question
+                    last_page_index = ((total_questions - 1)
                                        // QUESTIONS_PER_PAGE) + 1
                     questions_paginated = paginate_questions(
-                                            questions_rows, last_page_index)
+                                            Question.query, last_page_index)
+
+                    db.session.commit()
+                    _bump_data_version('questions_version')
 
                     # return data
-                    return jsonify({
+                    return ojsonify({
                         'success': True,
-                        'created': new_question.id,
-                        'question_created': new_question.question,
+                        'created': created_id,
+                        'question_created': new_question_question,
                         'questions': questions_paginated,
                         'total_questions': total_questions
                     })
 
             except Exception:
                 # exception details
-                print('\n * Error:\n', sys.exc_info(), '\n')
+                app.logger.exception('Request failed')
+                db.session.rollback()
                 # Server error
                 abort(500)
 
@@ -240,25 +393,26 @@ def create_app(test_config=None):
 
             # check the values are present
             if current_category is not None:
-                questions_by_category = Question.query.filter_by(
-                                          category=current_category.id).all()
+                category_filter = Question.category == current_category.id
+                questions_by_category = Question.query.filter(category_filter)
+                total_questions = count_questions(category_filter)
 
-                if len(questions_by_category) > 0:
+                if total_questions > 0:
 
                     questions_paginated = paginate_questions(
                                             questions_by_category)
 
                     # return data
-                    return jsonify({
+                    return ojsonify({
                         'success': True,
                         'questions': questions_paginated,
-                        'total_questions': len(questions_by_category),
+                        'total_questions': total_questions,
                         'current_category': current_category.type
                     })
 
         except Exception:
             # exception details
-            print('\n * Error:\n', sys.exc_info(), '\n')
+            app.logger.exception('Request failed')
             # Server error
             abort(500)
 
@@ -266,7 +420,7 @@ def create_app(test_config=None):
             # Unprocessable error
             abort(422)
 
-        if len(questions_by_category) == 0:
+        if total_questions == 0:
             # Empty result
             abort(404)
 
@@ -278,41 +432,54 @@ def create_app(test_config=None):
     def get_quiz_questions():
 
         # get list of previous questions id and quiz question category
-        request_json = request.get_json()
+        request_json = request.get_json(silent=True, cache=True)
+        if not isinstance(request_json, dict):
+            # missing or malformed json body
+            abort(400)
         previous_questions = request_json.get('previous_questions')
         quiz_category = request_json.get('quiz_category')
 
-        # check the values are present
-        if quiz_category is None or previous_questions is None:
+        # the frontend sends category ids as strings
+        category_id = (quiz_category.get('id')
+                       if isinstance(quiz_category, dict) else None)
+        if (isinstance(category_id, str) and category_id.isascii() and
+                category_id.isdigit()):
+            category_id = int(category_id)
+
+        # check the values are present and well formed
+        if (not isinstance(category_id, int) or
+                isinstance(category_id, bool) or
+                not isinstance(previous_questions, list) or
+                not all(isinstance(question_id, int)
+                        for question_id in previous_questions)):
             # Unprocessable error
             abort(422)
 
+        # drop duplicated ids sent by the client
+        previous_ids = set(previous_questions)
+
         # if category id equal zero that means get all questions
-        if (quiz_category['id'] == 0):
-            quiz_questions = Question.query.all()
-        else:
-            quiz_questions = Question.query.filter_by(
-                              category=quiz_category['id']).all()
+        quiz_questions = Question.query
+        if (category_id != 0):
+            quiz_questions = quiz_questions.filter_by(category=category_id)
+
+        # skip the previous questions and let the database pick one
+        if len(previous_ids) > 0:
+            quiz_questions = quiz_questions.filter(
+                              ~Question.id.in_(previous_ids))
+        picked_questions = format_question_rows(quiz_questions.order_by(
+                            func.random()).limit(1))
 
         # no new questions for showing, end quiz
-        if (len(quiz_questions) == len(previous_questions)):
-            return jsonify({
+        if len(picked_questions) == 0:
+            return ojsonify({
                   'success': True
             })
 
-        def generate_random_question():
-            random_index = random.randrange(0, len(quiz_questions), 1)
-            return quiz_questions[random_index]
-
-        # get new random question
-        current_question = generate_random_question()
-        while (current_question.id in previous_questions):
-            current_question = generate_random_question()
-
         # return data
-        return jsonify({
+        return ojsonify({
             'success': True,
-            'question': current_question.format()
+            'question': picked_questions[0]
         })
 
     '''
@@ -321,46 +488,26 @@ def create_app(test_config=None):
     # catch bad request 400
     @app.errorhandler(400)
     def catch_bad_request(error):
-        return jsonify({
-            'success': False,
-            'error': 400,
-            'message': 'Bad request error'
-        }), 400
+        return _error_response(400)
 
     # catch not found error 404
     @app.errorhandler(404)
     def catch_not_found(error):
-        return jsonify({
-            'success': False,
-            'error': 404,
-            'message': 'Resource not found'
-        }), 404
+        return _error_response(404)
 
     # catch Method not allowed 405
     @app.errorhandler(405)
     def catch_method_not_allowed(error):
-        return jsonify({
-            "success": False,
-            "error": 405,
-            "message": "Method not allowed"
-        }), 405
+        return _error_response(405)
 
     # catch unprocessable error 422
     @app.errorhandler(422)
     def catch_unprocessable(error):
-        return jsonify({
-            'success': False,
-            'error': 422,
-            'message': 'Unprocessable error'
-        }), 422
+        return _error_response(422)
 
     # catch server error 500
     @app.errorhandler(500)
     def catch_server_error(error):
-        return jsonify({
-            'success': False,
-            'error': 500,
-            'message': 'Internal server error has been occured'
-        }), 500
+        return _error_response(500)
 
     return app
@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, Index, DDL, create_engine, event
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -15,6 +15,13 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # reuse pooled connections across concurrent requests
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800
+    }
     db.app = app
     db.init_app(app)
     db.create_all()
@@ -25,6 +32,14 @@ Question
 '''
 class Question(db.Model):  
   __tablename__ = 'questions'
+  __table_args__ = (
+    # trigram index so the ILIKE '%term%' search avoids a sequential scan
+    Index('idx_question_question_trgm', 'question',
+          postgresql_using='gin',
+          postgresql_ops={'question': 'gin_trgm_ops'}),
+    # category listing filters by category and pages by id
+    Index('idx_questions_category_id', 'category', 'id'),
+  )
 
   id = Column(Integer, primary_key=True)
   question = Column(String)
@@ -58,6 +73,10 @@ class Question(db.Model):
       'difficulty': self.difficulty
     }
 
+# gin_trgm_ops is provided by the pg_trgm extension
+event.listen(Question.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+
 '''
 Category
 
@@ -44,6 +44,47 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['categories'])
 
+    '''
+    TEST get categories not modified
+    '''
+    def test_304_categories_not_modified(self):
+        # get the etag of the current categories
+        response = self.client().get('/categories')
+        etag = response.headers.get('ETag')
+
+        # request again with the etag
+        response = self.client().get('/categories', headers={
+                                        'If-None-Match': etag})
+
+        # check response data
+        self.assertTrue(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.data)
+
+    '''
+    TEST get questions etag after deleting a question
+    '''
+    def test_questions_etag_changes_after_delete(self):
+        # get the etag of the current questions
+        response = self.client().get('/questions')
+        etag = response.headers.get('ETag')
+        deleted_id = json.loads(response.data)['questions'][0]['id']
+
+        # the etag still matches while nothing changes
+        response = self.client().get('/questions', headers={
+                                        'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        # delete a question then request again with the old etag
+        self.client().delete('/questions/{}'.format(deleted_id))
+        response = self.client().get('/questions', headers={
+                                        'If-None-Match': etag})
+
+        # check response data
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers.get('ETag'))
+        self.assertNotEqual(response.headers.get('ETag'), etag)
+
     '''
     TEST get questions success
     '''
@@ -59,6 +100,22 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(len(data['questions']))
         self.assertTrue(data['total_questions'])
 
+    '''
+    TEST get questions after a question id success
+    '''
+    def test_get_questions_after_id(self):
+        # get json data from endpoint
+        response = self.client().get('/questions?after_id=5')
+        data = json.loads(response.data)
+
+        # check response data
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(len(data['questions']))
+        self.assertTrue(all(question['id'] > 5
+                            for question in data['questions']))
+        self.assertEqual(data['next_cursor'], data['questions'][-1]['id'])
+
     '''
     TEST get questions error
     '''
@@ -72,6 +129,20 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'Resource not found')
 
+    '''
+    TEST get questions out of range page error
+    '''
+    def test_404_paginated_questions_out_of_range(self):
+        # none of these pages may reach the database as an invalid OFFSET
+        for page_index in ('0', '-1', '1000000000000000000'):
+            response = self.client().get('/questions?page=' + page_index)
+            data = json.loads(response.data)
+
+            # check response data
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(data['success'], False)
+            self.assertEqual(data['message'], 'Resource not found')
+
     '''
     TEST delete question success
     '''
@@ -129,6 +200,30 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['total_questions'])
         self.assertTrue(len(data['questions']))
 
+    '''
+    TEST get questions total after creating a question
+    '''
+    def test_get_paginated_questions_after_create(self):
+        # memoize the current page of questions
+        response = self.client().get('/questions')
+        total_before = json.loads(response.data)['total_questions']
+
+        # create a question, the memoized page is now stale
+        response = self.client().post('/questions', json={
+                                        'question': 'question text test',
+                                        'answer': 'answer text test',
+                                        'difficulty': 1,
+                                        'category': 1})
+        self.assertEqual(response.status_code, 200)
+
+        # get json data from endpoint again
+        response = self.client().get('/questions')
+        data = json.loads(response.data)
+
+        # check response data
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['total_questions'], total_before + 1)
+
     '''
     TEST post new questions error
     '''
@@ -172,6 +267,34 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'Resource not found')
 
+    '''
+    TEST search questions with empty term error
+    '''
+    def test_400_questions_search_empty_term(self):
+        # get json data from endpoint
+        response = self.client().post('/questions', json={
+                                        'searchTerm': ''})
+        data = json.loads(response.data)
+
+        # check response data
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'Bad request error')
+
+    '''
+    TEST search questions with wildcard term error
+    '''
+    def test_404_questions_search_wildcard(self):
+        # get json data from endpoint
+        response = self.client().post('/questions', json={
+                                        'searchTerm': '%'})
+        data = json.loads(response.data)
+
+        # check response data
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'Resource not found')
+
     '''
     TEST questions by category success
     '''
@@ -216,6 +339,27 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['question'])
         self.assertEqual(data['question']['category'], 1)
 
+    '''
+    TEST get quiz questions end of quiz
+    '''
+    def test_get_quiz_questions_end(self):
+        # every question id of the category is already played
+        with self.app.app_context():
+            previous_questions = [question.id for question in
+                                  Question.query.filter_by(category=1)]
+
+        response = self.client().post('/quizzes', json={
+                                        'previous_questions':
+                                            previous_questions,
+                                        'quiz_category': {
+                                            'type': 'Science', 'id': '1'}})
+        data = json.loads(response.data)
+
+        # check response data
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertNotIn('question', data)
+
     '''
     TEST get quiz questions error
     '''
@@ -230,6 +374,54 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['message'], 'Unprocessable error')
 
 
+    '''
+    TEST get quiz questions malformed body error
+    '''
+    def test_400_quiz_questions_malformed_body(self):
+        # get json data from endpoint
+        response = self.client().post('/quizzes', data='{not json',
+                                      content_type='application/json')
+        data = json.loads(response.data)
+
+        # check response data
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'Bad request error')
+
+    '''
+    TEST get quiz questions invalid previous questions error
+    '''
+    def test_422_quiz_questions_invalid_previous(self):
+        # get json data from endpoint
+        response = self.client().post('/quizzes', json={
+                                        'previous_questions': 'invalid',
+                                        'quiz_category': {
+                                            'type': 'Science', 'id': '1'}})
+        data = json.loads(response.data)
+
+        # check response data
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'Unprocessable error')
+
+    '''
+    TEST get quiz questions invalid category id error
+    '''
+    def test_422_quiz_questions_invalid_category_id(self):
+        # neither id may reach the database
+        for category_id in ('abc', {}):
+            response = self.client().post('/quizzes', json={
+                                            'previous_questions': [],
+                                            'quiz_category': {
+                                                'type': 'Science',
+                                                'id': category_id}})
+            data = json.loads(response.data)
+
+            # check response data
+            self.assertEqual(response.status_code, 422)
+            self.assertEqual(data['success'], False)
+            self.assertEqual(data['message'], 'Unprocessable error')
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()